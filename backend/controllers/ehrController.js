@@ -11,6 +11,18 @@
     }
   };
 
+  // Store many EHRs in one round trip (used by the Python ingestion client)
+  const createEHRBulk = async (req, res) => {
+    try {
+      const records = Array.isArray(req.body) ? req.body : [];
+      if (!records.length) return res.status(400).json({ error: "Expected a non-empty array of EHRs" });
+      const inserted = await EHR.insertMany(records, { ordered: false });
+      res.status(201).json({ message: "EHRs stored successfully", inserted: inserted.length });
+    } catch (err) {
+      res.status(500).json({ error: err.message, inserted: err.insertedDocs ? err.insertedDocs.length : 0 });
+    }
+  };
+
   // Get all EHRs
   const getAllEHRs = async (req, res) => {
     try {
@@ -46,4 +58,4 @@
     res.status(500).json({ message: "Server Error", error: err.message });
   }
  };
-module.exports = { createEHR, getAllEHRs, getEHRByPatient };
+module.exports = { createEHR, createEHRBulk, getAllEHRs, getEHRByPatient };
@@ -0,0 +1,318 @@
+"""
+ehr_client.py — Pooled, batched ingestion client for the EHR backend
+--------------------------------------------------------------------
+- One keep-alive requests.Session shared by all workers (connection pool).
+- Records are grouped into batches and POSTed to /api/ehr/bulk.
+- Up to `max_workers` batches are in flight at once.
+- Only failures where the batch was certainly not stored are retried, with
+  exponential backoff: connect errors and 429/503 responses. The bulk insert
+  is not idempotent, so read timeouts and 502/504 are never retried.
+- Prints a throughput / error summary at the end.
+- Reads wolora.py outputs (*_structured.json) directly.
+
+Usage:
+    python backend/ehr_client.py recordings/
+    python backend/ehr_client.py recordings/convo_1_structured.json --batch-size 100 --workers 8
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.exceptions import NewConnectionError
+except ImportError:
+    raise ImportError("Please install requests: pip install requests")
+
+# ---------------------------
+# Config
+# ---------------------------
+DEFAULT_BASE_URL = "http://localhost:5000/api/ehr"  # change if your backend runs on a different port
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds, doubled on every retry
+DEFAULT_TIMEOUT = 30
+RETRY_STATUSES = {429, 503}  # rejected before the records were stored
+
+# wolora STRUCTURED_KEYS → backend entity type
+ENTITY_TYPES = {
+    "Disease": "Disease",
+    "Symptoms": "Symptom",
+    "Diagnosis": "Diagnosis",
+    "Medication": "Medication",
+    "Dosage": "Dosage",
+    "Duration": "Duration",
+    "FollowUp": "FollowUp",
+    "OtherAdvice": "OtherAdvice",
+    "BodyPart": "BodyPart",
+    "Test": "Test",
+    "Treatment": "Treatment",
+}
+
+
+# ---------------------------
+# wolora output → backend record
+# ---------------------------
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if v and str(v).strip()]
+    return [str(value).strip()] if str(value).strip() else []
+
+
+def record_from_structured(structured, patient_id, summary=None):
+    """
+    Convert a wolora `*_structured.json` dict into a payload for the EHR schema
+    (backend/models/EHR.js).
+    """
+    diagnoses = _as_list(structured.get("Diagnosis")) or _as_list(structured.get("Disease"))
+    symptoms = _as_list(structured.get("Symptoms"))
+
+    entities = []
+    for key, entity_type in ENTITY_TYPES.items():
+        for value in _as_list(structured.get(key)):
+            entities.append({"entity": value, "type": entity_type})
+
+    if not summary:
+        # `summary` is required by the schema; fall back to the extracted findings
+        parts = []
+        if diagnoses:
+            parts.append("Diagnosis: " + ", ".join(diagnoses))
+        if symptoms:
+            parts.append("Symptoms: " + ", ".join(symptoms))
+        summary = "; ".join(parts) or "No summary available."
+
+    return {
+        "patientId": patient_id,
+        "summary": summary,
+        "conditions": [{"code": d} for d in diagnoses],
+        "observations": [{"code": "Symptom", "valueString": s} for s in symptoms],
+        "medications": [{"name": m} for m in _as_list(structured.get("Medication"))],
+        "carePlan": {"description": "; ".join(
+            _as_list(structured.get("Treatment")) + _as_list(structured.get("OtherAdvice"))
+        )},
+        "entities": entities,
+    }
+
+
+def iter_structured_records(paths):
+    """
+    Yield backend records for every wolora *_structured.json file.
+    Directories are expanded to their *_structured.json files (sorted);
+    the patientId is taken from the file name (e.g. convo_1_structured.json → convo_1).
+    """
+    for p in paths:
+        p = Path(p)
+        files = sorted(p.glob("*_structured.json")) if p.is_dir() else [p]
+        for f in files:
+            try:
+                with open(f, "r", encoding="utf-8") as fh:
+                    structured = json.load(fh)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {f}: {e}")
+                continue
+            patient_id = f.stem[: -len("_structured")] if f.stem.endswith("_structured") else f.stem
+            yield record_from_structured(structured, patient_id)
+
+
+def request_never_sent(exc):
+    """True if `exc` means the request never reached the server (safe to retry)."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def iter_batches(records, batch_size):
+    batch = []
+    for r in records:
+        batch.append(r)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------
+# Client
+# ---------------------------
+class IngestSummary:
+    """Thread-safe counters for one upload run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.stored = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, sent=0, stored=0, failed=0, retries=0, error=None):
+        with self._lock:
+            self.batches += 1
+            self.sent += sent
+            self.stored += stored
+            self.failed += failed
+            self.retries += retries
+            if error:
+                self.errors.append(error)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def records_per_sec(self):
+        return self.stored / self.elapsed if self.elapsed > 0 else 0.0
+
+    def report(self):
+        print("\n==================== EHR UPLOAD SUMMARY ====================")
+        print(f"   - Records sent:   {self.sent} in {self.batches} batches")
+        print(f"   - Stored:         {self.stored}")
+        print(f"   - Failed:         {self.failed}")
+        print(f"   - Retries:        {self.retries}")
+        print(f"   - Elapsed:        {self.elapsed:.2f}s ({self.records_per_sec:.1f} records/s)")
+        for e in self.errors[:5]:
+            print(f"   ⚠️ {e}")
+        if len(self.errors) > 5:
+            print(f"   ... and {len(self.errors) - 5} more errors")
+        print("============================================================\n")
+
+
+class EHRClient:
+    """
+    Pooled, batched uploader for the EHR backend.
+
+    A single requests.Session is shared by all workers; its connection pool
+    is sized to `max_workers` so every worker keeps its own keep-alive socket.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, batch_size=DEFAULT_BATCH_SIZE,
+                 max_workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _post_with_retry(self, url, payload):
+        """Return (response or None, retries used, error message or None)."""
+        attempt = 0
+        while True:
+            error = None
+            try:
+                resp = self.session.post(url, json=payload, timeout=self.timeout)
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp, attempt, None
+                error = f"HTTP {resp.status_code}"
+            except requests.RequestException as e:
+                resp = None
+                error = str(e)
+                if not request_never_sent(e):
+                    # The server may already have stored the batch; don't risk duplicates
+                    return None, attempt, error
+
+            if attempt >= self.retries:
+                return resp, attempt, error
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def send_batch(self, batch):
+        """POST one batch; returns (stored, failed, retries, error)."""
+        if len(batch) == 1:
+            url, payload = self.base_url, batch[0]
+        else:
+            url, payload = f"{self.base_url}/bulk", batch
+
+        resp, retries, error = self._post_with_retry(url, payload)
+        if resp is None:
+            return 0, len(batch), retries, error
+        if resp.status_code >= 400:
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            stored = int(body.get("inserted", 0)) if isinstance(body, dict) else 0
+            message = body.get("error") if isinstance(body, dict) else None
+            return stored, len(batch) - stored, retries, f"HTTP {resp.status_code}: {message or resp.text[:200]}"
+        if len(batch) == 1:
+            return 1, 0, retries, None
+        try:
+            stored = int(resp.json().get("inserted", len(batch)))
+        except (ValueError, AttributeError):
+            stored = len(batch)
+        return stored, len(batch) - stored, retries, None
+
+    def upload(self, records):
+        """
+        Upload an iterable of records and return an IngestSummary.
+        At most `max_workers` batches are in flight, so large generators
+        are never fully materialized.
+        """
+        summary = IngestSummary()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            in_flight = {}
+
+            def _collect(done):
+                batch_len = in_flight.pop(done)
+                stored, failed, retries, error = done.result()
+                summary.add(sent=batch_len, stored=stored, failed=failed, retries=retries, error=error)
+
+            for batch in iter_batches(records, self.batch_size):
+                if len(in_flight) >= self.max_workers:
+                    _collect(next(as_completed(in_flight)))
+                in_flight[pool.submit(self.send_batch, batch)] = len(batch)
+
+            for done in as_completed(list(in_flight)):
+                _collect(done)
+
+        return summary.finish()
+
+
+# ---------------------------
+# Main
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload wolora structured outputs to the EHR backend")
+    parser.add_argument("inputs", nargs="+", help="*_structured.json files or directories")
+    parser.add_argument("--url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    args = parser.parse_args()
+
+    with EHRClient(args.url, batch_size=args.batch_size, max_workers=args.workers,
+                   retries=args.retries) as client:
+        result = client.upload(iter_structured_records(args.inputs))
+    result.report()
+    sys.exit(1 if result.failed else 0)
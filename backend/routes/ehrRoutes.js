@@ -1,8 +1,9 @@
 const express = require("express");
 const router = express.Router();
-const { createEHR, getAllEHRs, getEHRByPatient } = require("../controllers/ehrController");
+const { createEHR, createEHRBulk, getAllEHRs, getEHRByPatient } = require("../controllers/ehrController");
 
 router.post("/", createEHR);               // Store EHR
+router.post("/bulk", createEHRBulk);       // Store many EHRs
 router.get("/", getAllEHRs);               // Fetch all
 router.get("/:patient_id", getEHRByPatient); // Fetch by patient
 module.exports = router;
@@ -0,0 +1,138 @@
+"""
+Exercise ehr_client.EHRClient against a local stub of the /api/ehr backend.
+No MongoDB or Node server needed:
+
+    python backend/test_ehr_client.py
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ehr_client import EHRClient, record_from_structured
+
+
+class StubEHRHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like express
+    stored = []
+    fail_next = 0  # number of upcoming requests answered with fail_status
+    fail_status = 503
+    peers = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"null")
+        cls = type(self)
+        with cls.lock:
+            cls.peers.add(self.client_address)
+            if cls.fail_next > 0:
+                cls.fail_next -= 1
+                return self._reply(cls.fail_status, {"error": "busy"})
+            if self.path == "/api/ehr/bulk":
+                cls.stored.extend(payload)
+                return self._reply(201, {"message": "EHRs stored successfully", "inserted": len(payload)})
+            if self.path == "/api/ehr":
+                cls.stored.append(payload)
+                return self._reply(201, {"message": "EHR stored successfully", "ehr": payload})
+        self._reply(404, {"error": "not found"})
+
+
+def _start_stub():
+    StubEHRHandler.stored = []
+    StubEHRHandler.fail_next = 0
+    StubEHRHandler.fail_status = 503
+    StubEHRHandler.peers = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubEHRHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/ehr"
+
+
+def _records(n):
+    structured = {"Diagnosis": "Viral infection", "Symptoms": ["fever", "body pain"],
+                  "Medication": ["paracetamol 500 milligrams"]}
+    return (record_from_structured(structured, f"P{i:04d}") for i in range(n))
+
+
+def test_batched_upload_reuses_connections():
+    server, url = _start_stub()
+    try:
+        with EHRClient(url, batch_size=25, max_workers=4) as client:
+            summary = client.upload(_records(1000))
+        assert summary.stored == 1000 and summary.failed == 0
+        assert summary.batches == 40
+        assert len(StubEHRHandler.stored) == 1000
+        # one keep-alive socket per worker, not one per batch
+        assert len(StubEHRHandler.peers) <= 4
+    finally:
+        server.shutdown()
+
+
+def test_retry_with_backoff():
+    server, url = _start_stub()
+    try:
+        StubEHRHandler.fail_next = 2
+        with EHRClient(url, batch_size=10, max_workers=1, retries=3, backoff=0.01) as client:
+            summary = client.upload(_records(10))
+        assert summary.stored == 10 and summary.retries == 2
+    finally:
+        server.shutdown()
+
+
+def test_gives_up_after_retries():
+    server, url = _start_stub()
+    try:
+        StubEHRHandler.fail_next = 10
+        with EHRClient(url, batch_size=5, max_workers=1, retries=1, backoff=0.01) as client:
+            summary = client.upload(_records(5))
+        assert summary.stored == 0 and summary.failed == 5
+        assert summary.errors
+    finally:
+        server.shutdown()
+
+
+def test_no_retry_when_batch_may_be_stored():
+    server, url = _start_stub()
+    try:
+        StubEHRHandler.fail_next = 1
+        StubEHRHandler.fail_status = 504  # gateway timeout: backend may have inserted the batch
+        with EHRClient(url, batch_size=5, max_workers=1, retries=3, backoff=0.01) as client:
+            summary = client.upload(_records(5))
+        assert summary.retries == 0 and summary.failed == 5
+    finally:
+        server.shutdown()
+
+
+def test_retry_connection_refused():
+    server, url = _start_stub()
+    server.shutdown()
+    server.server_close()  # nothing listening: request is never sent
+    with EHRClient(url, batch_size=5, max_workers=1, retries=2, backoff=0.01) as client:
+        summary = client.upload(_records(5))
+    assert summary.retries == 2 and summary.failed == 5
+
+
+def test_record_from_structured():
+    record = record_from_structured({"Symptoms": ["fever"], "Diagnosis": ""}, "convo_1")
+    assert record["patientId"] == "convo_1"
+    assert record["summary"]  # required by the schema
+    assert record["observations"] == [{"code": "Symptom", "valueString": "fever"}]
+    assert {"entity": "fever", "type": "Symptom"} in record["entities"]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
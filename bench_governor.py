@@ -0,0 +1,97 @@
+"""
+bench_governor.py — Throughput with and without the CPU resource governor
+--------------------------------------------------------------------------
+Simulates the ASR / summary / Ollama stages running at the same time,
+one process per stage, each doing BLAS-heavy matrix multiplications (the same
+kind of work Whisper, T5 and llama.cpp do on CPU).
+
+- without governor: every stage uses one thread per core (library default)
+- with governor:    every stage gets its ResourceGovernor budget
+
+Usage:
+    python bench_governor.py
+    python bench_governor.py --seconds 20 --size 512 --cores 8
+"""
+
+import os
+import time
+import argparse
+import multiprocessing as mp
+
+from resource_governor import ResourceGovernor, THREAD_ENV_VARS, available_cores
+
+STAGES = ("asr", "summary", "ollama")
+
+
+def _stage_worker(stage, threads, size, seconds, start_event, results):
+    # Thread limits must be in the environment before numpy/BLAS is imported
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    import numpy as np
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal((size, size), dtype=np.float32)
+    b = rng.standard_normal((size, size), dtype=np.float32)
+    a @ b  # warm up BLAS thread pool
+
+    start_event.wait()
+    done = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        a @ b
+        done += 1
+    results[stage] = done / (time.perf_counter() - t0)
+
+
+def run_round(budgets, size, seconds):
+    ctx = mp.get_context("spawn")
+    with ctx.Manager() as manager:
+        results = manager.dict()
+        start_event = manager.Event()
+        procs = [
+            ctx.Process(target=_stage_worker, args=(stage, budgets[stage], size, seconds, start_event, results))
+            for stage in STAGES
+        ]
+        for p in procs:
+            p.start()
+        time.sleep(1.0)  # let every worker import numpy and warm up
+        start_event.set()
+        for p in procs:
+            p.join()
+        return dict(results)
+
+
+def print_round(title, budgets, results):
+    print(f"\n{title}")
+    for stage in STAGES:
+        print(f"   - {stage:<8} {budgets[stage]:>3} threads  {results.get(stage, 0.0):8.2f} matmul/s")
+    print(f"   = total             {sum(results.values()):8.2f} matmul/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CPU resource governor")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--size", type=int, default=384, help="Matrix size per multiplication")
+    parser.add_argument("--cores", type=int, default=0, help="Cores to share (default: all usable)")
+    args = parser.parse_args()
+
+    cores = args.cores or available_cores()
+    print(f"🧪 {len(STAGES)} concurrent stages on {cores} cores, {args.seconds:.0f}s per round")
+
+    ungoverned = {stage: cores for stage in STAGES}
+    governed = ResourceGovernor(total_cores=cores, state_dir=None).budgets(STAGES)
+
+    base = run_round(ungoverned, args.size, args.seconds)
+    print_round("Without governor:", ungoverned, base)
+
+    gov = run_round(governed, args.size, args.seconds)
+    print_round("With governor:", governed, gov)
+
+    base_total, gov_total = sum(base.values()), sum(gov.values())
+    if base_total:
+        print(f"\n📈 Throughput change: {100.0 * (gov_total - base_total) / base_total:+.1f}%")
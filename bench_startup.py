@@ -0,0 +1,100 @@
+"""
+bench_startup.py — Startup-time regression check for wolora.py
+----------------------------------------------------------------
+Times the fast paths of wolora.py in fresh interpreters and fails (exit 1)
+if any of them exceeds its budget, or if importing wolora pulls in a heavy
+dependency that should only be loaded by the stage that needs it.
+
+Checked:
+- `import wolora` must not import transformers / torch
+- `wolora.py --help`
+- `wolora.py --fhir-from <structured.json>` (must stay well under a second)
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 10 --max-seconds 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+WOLORA = ROOT / "wolora.py"
+HEAVY_MODULES = ("transformers", "torch")
+SAMPLE_STRUCTURED = {
+    "Disease": "Viral fever",
+    "Symptoms": ["slight fever for 7 days", "severe headache"],
+    "Diagnosis": "Viral infection",
+    "Medication": ["paracetamol 500 milligrams"],
+}
+
+
+def time_command(cmd, runs):
+    """Return (median, max) wall time of `cmd` over `runs` fresh processes."""
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True)
+        timings.append(time.perf_counter() - t0)
+        if proc.returncode != 0:
+            print(proc.stdout.decode("utf-8", errors="ignore"))
+            print(proc.stderr.decode("utf-8", errors="ignore"))
+            raise RuntimeError(f"Command failed: {' '.join(map(str, cmd))}")
+    return statistics.median(timings), max(timings)
+
+
+def heavy_imports_on_load():
+    code = (
+        "import sys, wolora; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", errors="ignore"))
+    out = proc.stdout.decode("utf-8", errors="ignore").strip().splitlines()
+    return [m for m in (out[-1] if out else "").split(",") if m]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup-time regression benchmark for wolora.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0,
+                        help="Budget for the median time of each fast path")
+    args = parser.parse_args()
+
+    failures = []
+
+    heavy = heavy_imports_on_load()
+    if heavy:
+        failures.append(f"import wolora loads heavy modules: {', '.join(heavy)}")
+    print(f"📦 Heavy modules on import: {', '.join(heavy) or 'none'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        structured_path = Path(tmp) / "convo_bench_structured.json"
+        structured_path.write_text(json.dumps(SAMPLE_STRUCTURED), encoding="utf-8")
+
+        cases = {
+            "--help": [sys.executable, str(WOLORA), "--help"],
+            "--fhir-from": [sys.executable, str(WOLORA), "--fhir-from", str(structured_path)],
+        }
+        print(f"⏱️ Startup times over {args.runs} runs (budget {args.max_seconds:.2f}s median):")
+        for name, cmd in cases.items():
+            median, worst = time_command(cmd, args.runs)
+            status = "ok" if median <= args.max_seconds else "SLOW"
+            print(f"   - {name:<12} median {median:.3f}s  max {worst:.3f}s  {status}")
+            if median > args.max_seconds:
+                failures.append(f"{name} took {median:.3f}s (budget {args.max_seconds:.2f}s)")
+
+        if not (Path(tmp) / "convo_bench_ehr_bundle.json").exists():
+            failures.append("--fhir-from did not write convo_bench_ehr_bundle.json")
+
+    for f in failures:
+        print(f"❌ {f}")
+    sys.exit(1 if failures else 0)
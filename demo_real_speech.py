@@ -14,44 +14,36 @@ Features:
 8. GPU/CPU automatic detection for Whisper model
 9. Whisper model cached locally
 10. Triggers wolora.py automatically after saving.
+11. --fast-start: loads models in background threads and starts capturing
+    audio immediately; buffered audio is transcribed once Whisper is ready.
 """
 
 import os
 os.environ["HF_HUB_DISABLE_SYMLINKS"] = "1"  # harmless even if unused by simple-whisper
 import re
 import sys
+import time
+import hashlib
 import queue
+import argparse
+import threading
 import joblib
 import soundfile as sf
 from pathlib import Path
 import numpy as np
-import pandas as pd
 import subprocess
-import torch
 from datetime import datetime
 
+from resource_governor import get_governor
+
 # --- Optional imports ---
 try:
     import sounddevice as sd
 except ImportError:
     raise RuntimeError("⚠️ Please install sounddevice: pip install sounddevice")
 
-# 🔁 REPLACED faster-whisper WITH simple whisper
-try:
-    import whisper
-except ImportError:
-    raise RuntimeError("⚠️ Please install whisper: pip install -U openai-whisper")
-
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.linear_model import LogisticRegression
-except ImportError:
-    raise RuntimeError("⚠️ Please install scikit-learn: pip install scikit-learn")
-
-try:
-    import spacy
-except ImportError:
-    raise RuntimeError("⚠️ Please install spaCy: pip install spacy")
+# Heavy imports (torch, whisper, scikit-learn, spaCy, pandas) are done inside
+# the loaders below so that --fast-start can overlap them with audio capture.
 
 
 # ---------------------------
@@ -71,6 +63,7 @@ PRETRAIN_CSV = "PreTraining.csv"
 
 ROLE_CLF_PATH = MODEL_DIR / "role_clf.pkl"
 ROLE_VEC_PATH = MODEL_DIR / "role_vectorizer.pkl"
+ROLE_HASH_PATH = MODEL_DIR / "role_clf.sha256"  # content hash of the diarize.csv the model was trained on
 ENTITY_DICT_PATH = MODEL_DIR / "entity_dict.pkl"
 
 VAD_THRESHOLD = 0.0008
@@ -88,6 +81,25 @@ def clean_text(text: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
 
+def clean_text_series(series):
+    """Vectorized clean_text() for a pandas Series."""
+    return (
+        series.astype(str)
+        .str.lower()
+        .str.replace(r"[^a-z0-9\s]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
 def vad_is_speech(audio_chunk: np.ndarray) -> bool:
     energy = np.mean(audio_chunk ** 2)
     if DEBUG_ENERGY:
@@ -163,23 +175,32 @@ def save_audio_as_mp3(audio_arr: np.ndarray, mp3_path: Path):
 # Role Classifier
 # ---------------------------
 def prepare_role_classifier(csv_path=DIARIZE_CSV):
-    if ROLE_CLF_PATH.exists() and ROLE_VEC_PATH.exists():
+    csv_hash = file_sha256(csv_path) if os.path.exists(csv_path) else None
+    saved_hash = ROLE_HASH_PATH.read_text().strip() if ROLE_HASH_PATH.exists() else None
+    if ROLE_CLF_PATH.exists() and ROLE_VEC_PATH.exists() and (csv_hash is None or csv_hash == saved_hash):
         print("✅ Loading saved role classifier...")
         clf = joblib.load(ROLE_CLF_PATH)
         vec = joblib.load(ROLE_VEC_PATH)
         return clf, vec
 
+    try:
+        import pandas as pd
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+    except ImportError:
+        raise RuntimeError("⚠️ Please install scikit-learn: pip install scikit-learn")
+
+    if ROLE_CLF_PATH.exists():
+        print(f"🔄 {csv_path} changed since the role classifier was trained.")
     print("🧠 Training new role classifier...")
     df = pd.read_csv(csv_path)
     utterances, labels = [], []
 
-    for _, row in df.iterrows():
-        if pd.notna(row.get("doctor")):
-            utterances.append(clean_text(row["doctor"]))
-            labels.append("doctor")
-        if pd.notna(row.get("patient")):
-            utterances.append(clean_text(row["patient"]))
-            labels.append("patient")
+    for role in ("doctor", "patient"):
+        if role in df.columns:
+            cleaned = clean_text_series(df[role].dropna()).tolist()
+            utterances.extend(cleaned)
+            labels.extend([role] * len(cleaned))
 
     if len(utterances) < 10:
         raise ValueError("❌ Not enough examples in diarize.csv")
@@ -190,10 +211,40 @@ def prepare_role_classifier(csv_path=DIARIZE_CSV):
 
     joblib.dump(clf, ROLE_CLF_PATH)
     joblib.dump(vec, ROLE_VEC_PATH)
+    ROLE_HASH_PATH.write_text(csv_hash or "")
     print("💾 Saved classifier to models/ folder.")
     return clf, vec
 
 
+def classify_roles(texts, role_clf, role_vec):
+    """
+    Predict doctor/patient for many utterances in a single sparse-matrix pass.
+    Returns one role per input text ("unknown" if classification fails).
+    """
+    if not texts:
+        return []
+    try:
+        X = role_vec.transform([clean_text(t) for t in texts])
+        return [str(r) for r in role_clf.predict(X)]
+    except Exception:
+        return ["unknown"] * len(texts)
+
+
+ROLE_PREFIX_RE = re.compile(r"^\[[^\]]*\]\s*")
+
+
+def relabel_transcript(txt_path, role_clf, role_vec):
+    """Re-classify every line of a saved transcript in one batch and rewrite it."""
+    with open(txt_path, "r", encoding="utf-8") as f:
+        texts = [ROLE_PREFIX_RE.sub("", line).strip() for line in f if line.strip()]
+    roles = classify_roles(texts, role_clf, role_vec)
+    lines = [f"[{role.capitalize()}] {text}" for role, text in zip(roles, texts)]
+    with open(txt_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    print(f"💾 Relabelled {len(lines)} lines in {txt_path}")
+    return lines
+
+
 # ---------------------------
 # Entity Dictionary
 # ---------------------------
@@ -202,6 +253,12 @@ def build_entity_resources(csv_path=PRETRAIN_CSV):
         print("✅ Loaded entity dictionary.")
         return joblib.load(ENTITY_DICT_PATH), None
 
+    try:
+        import pandas as pd
+        import spacy
+    except ImportError:
+        raise RuntimeError("⚠️ Please install spaCy: pip install spacy")
+
     print("🧩 Building entity dictionary...")
     df = pd.read_csv(csv_path)
     cols = ["symptom", "treatment", "bodypart", "diagnosis", "others"]
@@ -228,31 +285,117 @@ def build_entity_resources(csv_path=PRETRAIN_CSV):
 
 
 # ---------------------------
-# Load Models
+# Whisper ASR
 # ---------------------------
-print("🚀 Initializing pipeline...")
-role_clf, role_vec = prepare_role_classifier()
-entity_dict, nlp = build_entity_resources()
-
-print("🔊 Loading Whisper ASR model (simple whisper)...")
 WHISPER_CACHE_DIR = MODEL_DIR / "whisper_cache"
-WHISPER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-# GPU / CPU auto-detect for simple whisper
-if torch.cuda.is_available():
-    WHISPER_DEVICE = "cuda"
-    WHISPER_FP16 = True
-    print("✅ Using GPU (CUDA)")
-else:
-    WHISPER_DEVICE = "cpu"
-    WHISPER_FP16 = False  # fp16 not supported on CPU
-    print("✅ Using CPU mode")
 
-stt_model = whisper.load_model(
-    MODEL_SIZE,
-    device=WHISPER_DEVICE,
-    download_root=str(WHISPER_CACHE_DIR),
-)
+def load_whisper_model():
+    """Return (stt_model, fp16) on GPU if available, else CPU."""
+    try:
+        import torch
+        # 🔁 REPLACED faster-whisper WITH simple whisper
+        import whisper
+    except ImportError:
+        raise RuntimeError("⚠️ Please install whisper: pip install -U openai-whisper")
+
+    print("🔊 Loading Whisper ASR model (simple whisper)...")
+    WHISPER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    # GPU / CPU auto-detect for simple whisper
+    if torch.cuda.is_available():
+        device = "cuda"
+        fp16 = True
+        print("✅ Using GPU (CUDA)")
+    else:
+        device = "cpu"
+        fp16 = False  # fp16 not supported on CPU
+        print("✅ Using CPU mode")
+
+    stt_model = whisper.load_model(
+        MODEL_SIZE,
+        device=device,
+        download_root=str(WHISPER_CACHE_DIR),
+    )
+    return stt_model, fp16
+
+
+# ---------------------------
+# Model Warm-up
+# ---------------------------
+class ModelWarmup:
+    """
+    Loads the pipeline components and records how long each one took.
+
+    - start(parallel=False): loads everything one after another (blocking).
+    - start(parallel=True): one background thread per component, at most
+      `max_workers` loading at once (in loader order); use ready(name) to poll
+      and get(name) to block until a component is loaded.
+    """
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self.results = {}
+        self.errors = {}
+        self.load_times = {}
+        self._events = {name: threading.Event() for name in loaders}
+        self._slots = None
+
+    def _run(self, name):
+        if self._slots:
+            self._slots.acquire()
+        t0 = time.perf_counter()
+        try:
+            with get_governor().stage("warmup"):
+                self.results[name] = self.loaders[name]()
+        except Exception as e:
+            self.errors[name] = e
+            print(f"❌ Failed to load {name}: {e}")
+        finally:
+            self.load_times[name] = time.perf_counter() - t0
+            print(f"⏱️ {name} ready in {self.load_times[name]:.2f}s")
+            self._events[name].set()
+            if self._slots:
+                self._slots.release()
+
+    def start(self, parallel=False, max_workers=None):
+        if not parallel:
+            for name in self.loaders:
+                self._run(name)
+            return self
+        if max_workers and max_workers < len(self.loaders):
+            self._slots = threading.Semaphore(max_workers)
+        for name in self.loaders:
+            threading.Thread(target=self._run, args=(name,), name=f"warmup-{name}", daemon=True).start()
+        return self
+
+    def ready(self, name):
+        return self._events[name].is_set()
+
+    def get(self, name, timeout=None):
+        if not self._events[name].wait(timeout):
+            raise TimeoutError(f"{name} not loaded after {timeout}s")
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+    def report(self):
+        print("\n⏱️ Model load times:")
+        for name in self.loaders:
+            if name in self.load_times:
+                status = "failed" if name in self.errors else "ok"
+                print(f"   - {name:<10} {self.load_times[name]:6.2f}s ({status})")
+            else:
+                print(f"   - {name:<10} still loading")
+
+
+def create_warmup():
+    # Whisper first: with a small worker budget it gets the first loader slot
+    return ModelWarmup({
+        "asr": load_whisper_model,
+        "role": prepare_role_classifier,
+        "entities": build_entity_resources,
+    })
 
 
 # ---------------------------
@@ -270,7 +413,50 @@ def audio_callback(indata, frames, time_info, status):
 # ---------------------------
 # Real-Time Recording
 # ---------------------------
-def run_realtime():
+def transcribe_window(audio_array, warmup, prev_text):
+    """
+    Transcribe one audio window into one line per Whisper segment.
+    All segments of the window are role-classified in a single batch.
+    Returns (lines, updated prev_text).
+    """
+    stt_model, whisper_fp16 = warmup.get("asr")
+
+    # ✅ English-only transcription with simple whisper
+    with get_governor().stage("asr"):
+        result = stt_model.transcribe(
+            audio_array,
+            language="en",       # fixed to English only
+            task="transcribe",   # no translation, just EN text
+            fp16=whisper_fp16,
+        )
+
+    segments = [(seg.get("text") or "").strip() for seg in result.get("segments") or []]
+    if not segments:
+        segments = [(result.get("text") or "").strip()]
+
+    texts = []
+    for text in segments:
+        if not text:
+            continue
+        text = dedupe_transcript(text, prev_text)
+        if not text:
+            continue
+        prev_text += " " + text
+        texts.append(text)
+
+    if not texts:
+        return [], prev_text
+
+    try:
+        role_clf, role_vec = warmup.get("role")
+        roles = classify_roles(texts, role_clf, role_vec)
+    except Exception:
+        roles = ["unknown"] * len(texts)
+
+    return [f"[{role.capitalize()}] {text}" for role, text in zip(roles, texts)], prev_text
+
+
+def run_realtime(warmup):
     convo_number = next_conversation_number(RECORDINGS_DIR)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     mp3_path = RECORDINGS_DIR / f"convo_{convo_number}_{timestamp}.mp3"
@@ -282,6 +468,8 @@ def run_realtime():
 
     samples_needed = SAMPLE_RATE * AUDIO_SECONDS_PER_CHUNK
     buffer = []
+    pending_windows = []  # full audio windows waiting for Whisper
+    asr_failed = False    # Whisper could not be used — keep recording audio only
     recorded_audio = []
     transcript_lines = []
 
@@ -289,6 +477,15 @@ def run_realtime():
     active = False
     prev_text = ""
 
+    def drain_pending():
+        nonlocal prev_text
+        for audio_array in pending_windows:
+            lines, prev_text = transcribe_window(audio_array, warmup, prev_text)
+            for line in lines:
+                print(line)
+                transcript_lines.append(line)
+        pending_windows.clear()
+
     try:
         with sd.InputStream(
             samplerate=SAMPLE_RATE,
@@ -298,6 +495,8 @@ def run_realtime():
             callback=audio_callback,
         ):
             print("🎧 Listening...\n")
+            if not warmup.ready("asr"):
+                print("⏳ Whisper still loading — buffering audio...\n")
 
             while True:
                 try:
@@ -320,40 +519,29 @@ def run_realtime():
                             print("🔚 Silence detected — saving session.")
                             break
 
+                if asr_failed:
+                    continue
+
                 buffer.extend(chunk.tolist())
                 if len(buffer) >= samples_needed:
-                    audio_array = np.array(buffer, dtype=np.float32)
+                    pending_windows.append(np.array(buffer, dtype=np.float32))
                     buffer = []
 
-                    # ✅ English-only transcription with simple whisper
-                    result = stt_model.transcribe(
-                        audio_array,
-                        language="en",       # fixed to English only
-                        task="transcribe",   # no translation, just EN text
-                        fp16=WHISPER_FP16,
-                    )
-
-                    text = (result.get("text") or "").strip()
-                    if not text:
-                        continue
-
-                    text = dedupe_transcript(text, prev_text)
-                    prev_text += " " + text
-
-                    cleaned = clean_text(text)
-                    try:
-                        role_vecs = role_vec.transform([cleaned])
-                        role = role_clf.predict(role_vecs)[0]
-                    except Exception:
-                        role = "unknown"
-
-                    line = f"[{role.capitalize()}] {text}"
-                    print(line)
-                    transcript_lines.append(line)
+                    if warmup.ready("asr"):
+                        if len(pending_windows) > 1:
+                            print(f"📥 Whisper ready — transcribing {len(pending_windows)} buffered windows...")
+                        try:
+                            drain_pending()
+                        except Exception as e:
+                            print(f"❌ Transcription unavailable ({e}) — still recording audio.")
+                            asr_failed = True
+                            pending_windows.clear()
+                            buffer = []
 
     except KeyboardInterrupt:
         print("\n🛑 Stopped manually.")
 
+    # Save the audio first: waiting for Whisper below may take long or be interrupted
     if recorded_audio:
         audio_arr = np.concatenate(recorded_audio, axis=0).astype(np.float32)
         save_audio_as_mp3(audio_arr, mp3_path)
@@ -362,6 +550,16 @@ def run_realtime():
         else:
             print("⚠️ Audio not saved as MP3 (see ffmpeg error above).")
 
+    if pending_windows:
+        print(f"⏳ Waiting for Whisper to transcribe {len(pending_windows)} buffered windows "
+              "(Ctrl+C to skip)...")
+        try:
+            drain_pending()
+        except KeyboardInterrupt:
+            print("\n🛑 Skipped transcribing buffered audio — it is kept in the MP3.")
+        except Exception as e:
+            print(f"⚠️ Could not transcribe buffered audio: {e}")
+
     if transcript_lines:
         with open(txt_path, "w", encoding="utf-8") as f:
             f.write("\n".join(transcript_lines))
@@ -378,4 +576,27 @@ def run_realtime():
 # Entry Point
 # ---------------------------
 if __name__ == "__main__":
-    run_realtime()
+    parser = argparse.ArgumentParser(description="Real-time doctor/patient transcription")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="Load models in background threads and start capturing immediately")
+    parser.add_argument("--relabel", metavar="TRANSCRIPT",
+                        help="Re-classify doctor/patient roles of a saved transcript and exit")
+    args = parser.parse_args()
+
+    if args.relabel:
+        relabel_transcript(args.relabel, *prepare_role_classifier())
+        sys.exit(0)
+
+    print("🚀 Initializing pipeline...")
+    get_governor().report()
+    warmup = create_warmup().start(
+        parallel=args.fast_start,
+        max_workers=get_governor().threads_for("warmup"),
+    )
+    if not args.fast_start:
+        warmup.report()
+        if "asr" in warmup.errors:
+            sys.exit(1)
+    run_realtime(warmup)
+    if args.fast_start:
+        warmup.report()
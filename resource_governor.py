@@ -0,0 +1,248 @@
+"""
+resource_governor.py — CPU core budgeting for Whisper, T5, model warm-up and Ollama
+-----------------------------------------------------------------------------------
+Whisper (torch), the T5 summarizer (torch) and Ollama all default to "one thread
+per core". When they overlap on a CPU-only host they oversubscribe the cores and
+thrash. The governor splits the host's cores between the stages that are
+currently active, weighted per stage, and applies the budget:
+
+- torch stages ("asr", "summary"): torch.set_num_threads / set_num_interop_threads
+- "ollama": num_thread option passed with each request (fixed per process: a
+  changed num_thread makes Ollama reload the model)
+- "warmup": number of models the recorder loads at once (--fast-start)
+
+Active stages are tracked per host in a small state directory (one marker file
+per process and stage), so the recorder and a wolora.py run in another process
+see each other and shrink their budgets accordingly.
+
+Configuration (environment):
+    MED_GOVERNOR=0                       disable (every stage gets all cores)
+    MED_CPU_CORES=8                      cores to share (default: all usable cores)
+    MED_CPU_WEIGHTS=asr=3,summary=2,ollama=4,warmup=2
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+# ---------------------------
+# Config
+# ---------------------------
+DEFAULT_WEIGHTS = {"asr": 3, "summary": 2, "ollama": 4, "warmup": 2}
+TORCH_STAGES = {"asr", "summary"}
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+STATE_DIR = Path(tempfile.gettempdir()) / "med_governor"
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def parse_weights(spec):
+    """'asr=3,ollama=4' → {"asr": 3, "ollama": 4}"""
+    weights = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            try:
+                weights[name.strip()] = max(0.0, float(value))
+            except ValueError:
+                print(f"⚠️ Ignoring invalid CPU weight: {part}")
+    return weights
+
+
+def _pid_alive_windows(pid):
+    # os.kill() would terminate the process on Windows; ask the kernel instead
+    import ctypes
+    from ctypes import wintypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+    ERROR_ACCESS_DENIED = 5
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Access denied means the process exists but belongs to someone else
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return _pid_alive_windows(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ---------------------------
+# Governor
+# ---------------------------
+class ResourceGovernor:
+    """
+    Share `total_cores` between active stages in proportion to their weights.
+    Every active stage gets at least one thread.
+    """
+
+    def __init__(self, total_cores=None, weights=None, enabled=True, state_dir=STATE_DIR):
+        self.total_cores = total_cores or available_cores()
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        self.enabled = enabled
+        self.state_dir = Path(state_dir) if state_dir else None
+        self._local = {}
+        self._lock = threading.Lock()
+        self._interop_set = False
+        self._ollama_threads = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            total_cores=int(os.environ.get("MED_CPU_CORES", 0) or 0) or None,
+            weights=parse_weights(os.environ.get("MED_CPU_WEIGHTS")),
+            enabled=os.environ.get("MED_GOVERNOR", "1") != "0",
+        )
+
+    # ----- active stage tracking -----
+    def _marker(self, stage):
+        return self.state_dir / f"{stage}.{os.getpid()}"
+
+    def active_stages(self):
+        """Stages active in this process plus those marked by other live processes."""
+        with self._lock:
+            active = {s for s, n in self._local.items() if n > 0}
+        if self.state_dir and self.state_dir.exists():
+            for marker in self.state_dir.iterdir():
+                stage, _, pid = marker.name.rpartition(".")
+                if not stage or not pid.isdigit():
+                    continue
+                if _pid_alive(int(pid)):
+                    active.add(stage)
+                else:
+                    try:
+                        marker.unlink()
+                    except OSError:
+                        pass
+        return active
+
+    def _activate(self, stage):
+        with self._lock:
+            self._local[stage] = self._local.get(stage, 0) + 1
+            first = self._local[stage] == 1
+        if first and self.state_dir:
+            try:
+                self.state_dir.mkdir(parents=True, exist_ok=True)
+                self._marker(stage).touch()
+            except OSError:
+                pass
+
+    def _deactivate(self, stage):
+        with self._lock:
+            self._local[stage] = max(0, self._local.get(stage, 0) - 1)
+            last = self._local[stage] == 0
+        if last and self.state_dir:
+            try:
+                self._marker(stage).unlink()
+            except OSError:
+                pass
+
+    # ----- budgets -----
+    def budgets(self, active=None):
+        """Return {stage: threads} for the given (or currently) active stages."""
+        active = set(active if active is not None else self.active_stages())
+        if not active:
+            return {}
+        if not self.enabled:
+            return {s: self.total_cores for s in active}
+
+        weights = {s: self.weights.get(s, 1.0) or 1.0 for s in active}
+        total_weight = sum(weights.values())
+        shares = {s: self.total_cores * w / total_weight for s, w in weights.items()}
+
+        # Largest remainder rounding, at least one thread per stage
+        budget = {s: max(1, int(share)) for s, share in shares.items()}
+        spare = self.total_cores - sum(budget.values())
+        for s in sorted(shares, key=lambda s: shares[s] - budget[s], reverse=True):
+            if spare <= 0:
+                break
+            budget[s] += 1
+            spare -= 1
+        return budget
+
+    def threads_for(self, stage):
+        """Thread budget for `stage`, assuming it is (about to be) active."""
+        return self.budgets(self.active_stages() | {stage})[stage]
+
+    def ollama_options(self):
+        """
+        Options for Ollama requests. num_thread is a runner option: Ollama reloads
+        the model whenever it changes, so it is computed once per process from the
+        configured weights, as if every stage were active.
+        """
+        if not self.enabled:
+            return {}
+        if self._ollama_threads is None:
+            self._ollama_threads = self.budgets(set(self.weights) | {"ollama"})["ollama"]
+        return {"num_thread": self._ollama_threads}
+
+    def apply_torch(self, threads):
+        """Set torch intra-op threads (and inter-op threads once, if still allowed)."""
+        torch = sys.modules.get("torch")
+        if torch is None or not self.enabled:
+            return
+        torch.set_num_threads(threads)
+        if not self._interop_set:
+            self._interop_set = True
+            try:
+                torch.set_num_interop_threads(max(1, min(2, threads)))
+            except RuntimeError:
+                pass  # can only be set before torch starts inter-op work
+
+    @contextmanager
+    def stage(self, name):
+        """Mark `name` active for the duration of the block and apply its budget."""
+        self._activate(name)
+        try:
+            threads = self.threads_for(name)
+            if name in TORCH_STAGES:
+                self.apply_torch(threads)
+            yield threads
+        finally:
+            self._deactivate(name)
+
+    def report(self):
+        active = self.active_stages()
+        print(f"🧮 CPU budget ({self.total_cores} cores, governor {'on' if self.enabled else 'off'}):")
+        for stage, threads in sorted(self.budgets(active or set(self.weights)).items()):
+            mark = "active" if stage in active else "idle"
+            print(f"   - {stage:<8} {threads:>3} threads ({mark})")
+
+
+_governor = None
+
+
+def get_governor():
+    """Process-wide governor configured from the environment."""
+    global _governor
+    if _governor is None:
+        _governor = ResourceGovernor.from_env()
+    return _governor
@@ -0,0 +1,186 @@
+"""
+Unit tests for wolora.TermNormalizer (against the real PreTraining.csv vocabulary)
+and the FHIR bundle / bulk NDJSON export. No Ollama or transformers needed:
+
+    python test_wolora.py
+"""
+
+import gzip
+import json
+import tempfile
+from pathlib import Path
+
+import wolora
+from wolora import (FhirNdjsonWriter, TermNormalizer, build_entity_resources,
+                    normalize_entities, run_bulk, to_fhir_bundle)
+
+PRETRAIN_CSV = Path(__file__).resolve().parent / "PreTraining.csv"
+_entity_dict, _known_terms = build_entity_resources(str(PRETRAIN_CSV))
+NORMALIZER = TermNormalizer(_known_terms, _entity_dict)
+
+
+def _terms(text, categories=None):
+    return [c["term"] for c in NORMALIZER.normalize(text, categories)["canonical"]]
+
+
+def test_lookup_exact_and_fuzzy():
+    assert NORMALIZER.lookup("fever") == [("fever", 1.0)]
+    term, score = NORMALIZER.lookup("paracetmol")[0]
+    assert term == "paracetamol" and 0.75 <= score < 1.0
+    assert NORMALIZER.lookup("covid 19") == [("covid-19", 1.0)]
+
+
+def test_lookup_rejects_loose_single_words():
+    assert NORMALIZER.lookup("water") == []
+    assert NORMALIZER.lookup("drink") == []
+    assert NORMALIZER.lookup("left") == []
+
+
+def test_numbers_in_terms_must_match():
+    assert "type 1 diabetes" not in [t for t, _ in NORMALIZER.lookup("type 2 diabetes", top_k=5)]
+    assert _terms("type 2 diabetes") == ["diabetes mellitus type 2"]
+    assert _terms("covid 19") == ["covid-19"]
+
+
+def test_qualifiers():
+    result = NORMALIZER.normalize("slight fever for 7 days")
+    assert [c["term"] for c in result["canonical"]] == ["fever"]
+    assert result["qualifiers"] == ["7 days"]
+    assert NORMALIZER.normalize("paracetmol 500 mg")["qualifiers"] == ["500 mg"]
+    assert NORMALIZER.normalize("two weeks of rest")["qualifiers"] == ["two weeks"]
+    # bare numbers are only qualifiers after for/since/x
+    assert NORMALIZER.normalize("type 2 diabetes")["qualifiers"] == []
+    assert NORMALIZER.normalize("fever x 3")["qualifiers"] == ["3"]
+
+
+def test_no_false_canonical_terms():
+    assert _terms("come back if symptoms worsen") == []
+    assert _terms("drink water") == []
+    assert _terms("left knee pain") == ["knee pain"]
+
+
+def test_exact_sub_span_wins_over_loose_match():
+    def best(text):
+        return [(c["term"], c["score"]) for c in NORMALIZER.normalize(text)["canonical"]]
+
+    assert best("fever with chills at night") == [("fever with chills", 1.0)]
+    assert best("ibuprofen 200 mg twice a day") == [("ibuprofen", 1.0)]
+    assert best("hypertension stage 2") == [("hypertension", 1.0)]
+    assert best("cough with phlegm since morning") == [("cough with phlegm", 1.0)]  # no "morning pain"
+
+
+def test_multiple_entities():
+    assert _terms("chest pain and cough") == ["chest pain", "cough"]
+    assert _terms("nausea and fatigue") == ["nausea and fatigue"]
+
+
+def test_normalize_entities_uses_key_categories():
+    normalized = normalize_entities({"BodyPart": ["back"], "FollowUp": "back pain review"}, NORMALIZER)
+    assert [c["term"] for c in normalized["BodyPart"][0]["canonical"]] == ["back"]
+    for c in normalized["FollowUp"][0]["canonical"]:
+        assert {"treatment", "others"} & set(c["category"])
+
+
+def _read_ndjson(path):
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_bundle_one_resource_per_value():
+    bundle = to_fhir_bundle({"Symptoms": "fever, cough", "Diagnosis": ["flu", "", "covid-19"]}, "convo_1")
+    resources = [e["resource"] for e in bundle["entry"]]
+    observations = [r for r in resources if r["resourceType"] == "Observation"]
+    conditions = [r for r in resources if r["resourceType"] == "Condition"]
+    assert [o["code"]["text"] for o in observations] == ["fever, cough"]
+    assert [c["code"]["text"] for c in conditions] == ["flu", "covid-19"]
+
+
+def test_fhir_ids_are_valid_and_distinct():
+    def ids(visit_id, source=None):
+        return [e["resource"]["id"] for e in to_fhir_bundle({"Symptoms": ["fever"]}, visit_id, source=source)["entry"]]
+
+    assert ids("convo-1")[0] == "patient-convo-1"  # clean ids stay readable
+    assert not set(ids("a b")) & set(ids("a-b"))
+    assert not set(ids("convo_1", "/a/convo_1.txt")) & set(ids("convo_1", "/b/convo_1.txt"))
+    long_ids = ids("v" * 80)
+    assert all(len(i) <= 64 for i in long_ids) and len(set(long_ids)) == len(long_ids)
+
+
+def test_ndjson_split_per_resource_type():
+    with tempfile.TemporaryDirectory() as tmp:
+        with FhirNdjsonWriter(tmp) as writer:
+            writer.write_bundle(to_fhir_bundle({"Symptoms": ["fever", "cough"], "Diagnosis": "flu"}, "v1"))
+            writer.write_bundle(to_fhir_bundle({"Symptoms": ["headache"]}, "v2"))
+        files = sorted(p.name for p in Path(tmp).iterdir())
+        assert files == ["Condition.ndjson", "Encounter.ndjson", "Observation.ndjson",
+                         "Patient.ndjson", "Practitioner.ndjson"]
+        assert writer.counts == {"Patient": 2, "Practitioner": 2, "Encounter": 2,
+                                 "Condition": 1, "Observation": 3}
+        for name in files:
+            for line in _read_ndjson(Path(tmp) / name):
+                assert json.loads(line)["resourceType"] == name.split(".")[0]
+
+
+def test_ndjson_compact_one_line_per_resource():
+    with tempfile.TemporaryDirectory() as tmp:
+        with FhirNdjsonWriter(tmp) as writer:
+            writer.write_resource({"resourceType": "Observation", "id": "o1", "code": {"text": "a\nb"}})
+            writer.write_resource({"resourceType": "Observation", "id": "o2", "code": {"text": "fièvre"}})
+        lines = _read_ndjson(Path(tmp) / "Observation.ndjson")
+        assert len(lines) == 2
+        assert lines[0] == '{"resourceType":"Observation","id":"o1","code":{"text":"a\\nb"}}'
+        assert json.loads(lines[1])["code"]["text"] == "fièvre"
+
+
+def test_ndjson_gzip_round_trip():
+    bundle = to_fhir_bundle({"Symptoms": ["fever"], "Diagnosis": "flu"}, "v1")
+    with tempfile.TemporaryDirectory() as tmp:
+        with FhirNdjsonWriter(tmp, gzip_output=True) as writer:
+            writer.write_bundle(bundle)
+        assert all(p.name.endswith(".ndjson.gz") for p in Path(tmp).iterdir())
+        restored = [json.loads(line) for p in sorted(Path(tmp).iterdir()) for line in _read_ndjson(p)]
+    expected = [e["resource"] for e in bundle["entry"]]
+    key = lambda r: (r["resourceType"], r["id"])
+    assert sorted(restored, key=key) == sorted(expected, key=key)
+
+
+def test_bulk_ids_and_references_per_visit():
+    ner = wolora.ask_ollama_json_ner
+    wolora.ask_ollama_json_ner = lambda text: {"Symptoms": text.split(","), "Diagnosis": "flu"}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for folder, text in (("a", "fever,cough"), ("b", "headache")):
+                (tmp / folder).mkdir()
+                (tmp / folder / "convo_1.txt").write_text(text, encoding="utf-8")  # same name twice
+            run_bulk([tmp / "a", tmp / "b"], ndjson_dir=tmp / "out", normalizer=NORMALIZER)
+            resources = {p.stem: [json.loads(line) for line in _read_ndjson(p)]
+                         for p in (tmp / "out").iterdir()}
+    finally:
+        wolora.ask_ollama_json_ner = ner
+
+    all_ids = [r["id"] for rs in resources.values() for r in rs]
+    assert len(all_ids) == len(set(all_ids))
+    assert len(resources["Patient"]) == len(resources["Encounter"]) == 2
+    patients = {f"Patient/{r['id']}" for r in resources["Patient"]}
+    encounters = {f"Encounter/{r['id']}": r["subject"]["reference"] for r in resources["Encounter"]}
+    assert set(encounters.values()) == patients
+    for r in resources["Observation"] + resources["Condition"]:
+        # every clinical resource points at its own visit's Patient and Encounter
+        assert encounters[r["encounter"]["reference"]] == r["subject"]["reference"]
+    by_visit = {}
+    for o in resources["Observation"]:
+        by_visit.setdefault(o["encounter"]["reference"], []).append(o["code"]["text"])
+    assert sorted(by_visit.values()) == [["fever", "cough"], ["headache"]]
+    # canonical terms travel with the export
+    codings = {o["code"]["text"]: [c["code"] for c in o["code"]["coding"]] for o in resources["Observation"]}
+    assert codings == {"fever": ["fever"], "cough": ["cough"], "headache": ["headache"]}
+    assert {c["code"]["coding"][0]["system"] for c in resources["Condition"]} == {wolora.PRETRAIN_CODE_SYSTEM}
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
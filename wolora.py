@@ -7,9 +7,18 @@ wolora.py — Fast Ollama + T5 EMR summarization & NER pipeline
 - Produces:
     - convo_*_structured.json
     - convo_*_ehr_bundle.json
+    - convo_*_normalized.json (entities mapped to PreTraining.csv terms)
+    - or, in bulk mode, FHIR Bulk Data–style NDJSON files (Patient.ndjson, Observation.ndjson, ...)
 
 Usage:
     python wolora.py --input recordings/convo_1.txt
+    python wolora.py --input recordings/convo_1.txt --skip-summary
+    python wolora.py --input recordings/convo_1.txt --ner-only
+    python wolora.py --fhir-from recordings/convo_1_structured.json
+    python wolora.py --bulk recordings/ --ndjson_dir export --gzip
+
+Heavy dependencies (transformers/torch) are imported only by the stages that
+need them, so --help, --ner-only and --fhir-from start fast.
 """
 
 import os
@@ -22,13 +31,15 @@ from datetime import datetime
 from pprint import pprint
 from pathlib import Path
 import csv
+import gzip
+import html
+import hashlib
 import shutil
+import urllib.request
+import urllib.error
+from collections import defaultdict
 
-# transformers only required for T5 summarizer
-try:
-    from transformers import pipeline
-except ImportError:
-    raise ImportError("Please install transformers: pip install transformers")
+from resource_governor import get_governor
 
 # ---------------------------
 # Config
@@ -41,6 +52,11 @@ LAST_INPUT_CACHE_FILE = "last_input.txt"
 DEFAULT_PRETRAIN_CSV = "PreTraining.csv"
 OLLAMA_MODEL = "llama3"  # you can switch to a smaller model if RAM is low
 OLLAMA_TIMEOUT = 300  # increased for long conversations
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+NDJSON_DEFAULT_DIR = "fhir_export"
+FHIR_ID_MAX_LEN = 64  # FHIR id: [A-Za-z0-9-.]{1,64}
+FHIR_ID_HASH_LEN = 8
+PRETRAIN_CODE_SYSTEM = "urn:med:pretraining-terms"  # code.coding system for canonical PreTraining.csv terms
 
 # 🔧 CUSTOM OLLAMA PATH CONFIGURATION
 CUSTOM_OLLAMA_PATH = r"C:\Users\rtivy\AppData\Local\Programs\Ollama\ollama.exe"  # your actual path
@@ -54,7 +70,7 @@ def detect_device():
     os.environ["OLLAMA_LLM_LIBRARY"] = "cpu"  # Ensures Ollama uses CPU
     return "cpu"
 
-DEVICE_TYPE = detect_device()
+DEVICE_TYPE = None  # set by detect_device() once a stage needs Ollama
 
 # ---------------------------
 # Ollama executable resolver
@@ -102,15 +118,59 @@ def get_last_input_path():
             return f.read().strip()
     return None
 
+def run_ollama_api(prompt, model=OLLAMA_MODEL, timeout=OLLAMA_TIMEOUT, options=None):
+    """
+    Call a running Ollama server over HTTP (/api/generate).
+    Unlike the CLI this accepts per-request options such as num_thread.
+
+    Returns None only if no connection could be made (the caller may fall back
+    to the CLI). Once the server has accepted the request, a failure or read
+    timeout returns "" so the prompt is not run a second time.
+    """
+    host = OLLAMA_HOST if "://" in OLLAMA_HOST else f"http://{OLLAMA_HOST}"
+    payload = {"model": model, "prompt": prompt, "stream": False}
+    if options:
+        payload["options"] = options
+    req = urllib.request.Request(
+        f"{host.rstrip('/')}/api/generate",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return (json.loads(resp.read().decode("utf-8")).get("response") or "").strip()
+    except urllib.error.HTTPError as e:
+        print(f"⚠️ Ollama server error: {e}")
+        return ""
+    except urllib.error.URLError:
+        return None  # connection refused / host unreachable / connect timeout
+    except (TimeoutError, OSError):
+        print("⚠️ Ollama call timed out.")
+        return ""
+    except ValueError as e:
+        print(f"⚠️ Ollama returned invalid JSON: {e}")
+        return ""
+
 def run_ollama_raw(prompt, model=OLLAMA_MODEL, timeout=OLLAMA_TIMEOUT):
     """
     Call Ollama with a raw prompt.
 
     Supports:
+    - HTTP API of a running server (used when the resource governor sets num_thread)
     - CLI on PATH (['ollama'])
     - Custom exe path ([CUSTOM_OLLAMA_PATH])
     - Pip-installed module ([sys.executable, '-m', 'ollama'])
     """
+    governor = get_governor()
+    with governor.stage("ollama"):
+        options = governor.ollama_options()
+        if options:
+            out = run_ollama_api(prompt, model=model, timeout=timeout, options=options)
+            if out is not None:
+                return out or None
+        return run_ollama_cli(prompt, model=model, timeout=timeout)
+
+def run_ollama_cli(prompt, model=OLLAMA_MODEL, timeout=OLLAMA_TIMEOUT):
     base_cmd = get_ollama_executable()
     cmd = base_cmd + ["run", model]
 
@@ -171,10 +231,213 @@ def build_entity_resources(pretrain_csv_path=DEFAULT_PRETRAIN_CSV):
         print(f"⚠️ Could not load PreTraining CSV: {e}")
     return entity_dict, known_terms
 
+# ---------------------------
+# Fuzzy term normalization (trigram inverted index)
+# ---------------------------
+NUMBER_WORDS = (
+    "one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|"
+    "fifteen|twenty|thirty|half"
+)
+QUANTITY_UNITS = (
+    "days?|weeks?|months?|years?|hours?|hrs?|minutes?|mins?|"
+    "milligrams?|mg|micrograms?|mcg|grams?|g|millilit(?:er|re)s?|ml|"
+    "units?|tablets?|tabs?|capsules?|drops?|puffs?|times?"
+)
+# "for 7 days", "200 milligrams", "two weeks", "x 3"...
+# A bare number only counts when "for/since/x" precedes it, so the digits of
+# "type 2 diabetes" or "covid 19" stay part of the term.
+QUALIFIER_RE = re.compile(
+    rf"(?:\b(?:for|since|of|over|x)\s*)?"
+    rf"\b(?P<q>(?:\d+(?:\.\d+)?\s*|(?:{NUMBER_WORDS})\s+)(?:{QUANTITY_UNITS})\b"
+    rf"(?:\s+(?:a|per)\s+(?:day|week|month)\b)?)"
+    rf"|\b(?:for|since|x)\s*(?P<bare>\d+(?:\.\d+)?)\b",
+    re.IGNORECASE,
+)
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "and", "or", "with", "to",
+    "since", "over", "at", "by", "from", "is", "has", "have", "x",
+}
+# Severity/frequency words are never matched on their own ("slight" must not become "sunlight")
+MODIFIERS = {
+    "slight", "mild", "moderate", "severe", "acute", "chronic", "occasional",
+    "frequent", "persistent", "sudden", "recurrent", "high", "low", "very", "bad",
+}
+# Time/frequency words: never matched on their own ("morning" must not become "morning pain")
+TIME_WORDS = {
+    "morning", "mornings", "afternoon", "evening", "evenings", "night", "nights", "tonight",
+    "today", "yesterday", "day", "days", "daily", "week", "weeks", "weekly", "month", "months",
+    "hour", "hours", "once", "twice", "thrice", "noon",
+}
+# Phrases whose words are not clinical terms here ("come back" is not the body part)
+FILLER_RE = re.compile(r"\b(?:come|coming|go|get|call|be|came)\s+back\b")
+MAX_SPAN_WORDS = 5
+MIN_SCORE = 0.6               # fuzzy matches below this are dropped
+MIN_SINGLE_WORD_SCORE = 0.75  # non-exact matches of one-word spans must be this close
+
+# Which PreTraining.csv columns each structured key may be normalized into
+KEY_CATEGORIES = {
+    "Disease": {"diagnosis", "others"},
+    "Symptoms": {"symptom", "bodypart", "others"},
+    "Diagnosis": {"diagnosis", "others"},
+    "Medication": {"treatment"},
+    "Dosage": {"treatment"},
+    "Duration": set(),
+    "FollowUp": {"treatment", "others"},
+    "OtherAdvice": {"treatment", "others"},
+    "BodyPart": {"bodypart"},
+    "Test": {"treatment", "others"},
+    "Treatment": {"treatment", "others"},
+}
+
+
+def trigrams(term):
+    """pg_trgm-style character trigrams: two leading blanks, one trailing."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TermNormalizer:
+    """
+    Map free-text entity strings onto canonical PreTraining.csv terms.
+
+    - An inverted index trigram → term ids is built once over `known_terms`.
+    - A lookup only scores terms that share at least one trigram with the
+      query (Dice similarity), so each lookup is sub-millisecond and a batch
+      of visits never needs a pairwise fuzzy-match pass.
+    - Numeric qualifiers ("7 days", "200 milligrams") are split off and
+      returned separately. Numbers that are part of a term must match exactly
+      ("type 2 diabetes" never becomes "type 1 diabetes").
+    """
+
+    def __init__(self, known_terms, entity_dict=None, min_score=MIN_SCORE):
+        self.terms = sorted(known_terms)
+        self.term_ids = {}
+        self.term_sizes = []
+        self.term_digits = []
+        self.index = defaultdict(list)
+        for tid, term in enumerate(self.terms):
+            self.term_ids[term] = tid
+            self.term_ids.setdefault(term.replace("-", " "), tid)  # "covid 19" → "covid-19"
+            grams = trigrams(term)
+            self.term_sizes.append(len(grams))
+            self.term_digits.append(frozenset(re.findall(r"\d+", term)))
+            for g in grams:
+                self.index[g].append(tid)
+        self.categories = defaultdict(list)
+        for category, values in (entity_dict or {}).items():
+            for v in values:
+                self.categories[v].append(category)
+        self.min_score = min_score
+
+    def _allowed(self, tid, categories):
+        if categories is None:
+            return True
+        return bool(categories.intersection(self.categories.get(self.terms[tid], ())))
+
+    def lookup(self, phrase, top_k=1, categories=None):
+        """
+        Return up to top_k (term, score) pairs for a single phrase.
+        `categories` restricts results to terms from those PreTraining.csv columns.
+        """
+        phrase = phrase.strip().lower()
+        if not phrase:
+            return []
+        tid = self.term_ids.get(phrase)
+        if tid is not None and self._allowed(tid, categories):
+            return [(self.terms[tid], 1.0)]
+        grams = trigrams(phrase)
+        digits = frozenset(re.findall(r"\d+", phrase))
+        min_score = self.min_score if " " in phrase else max(self.min_score, MIN_SINGLE_WORD_SCORE)
+        shared = defaultdict(int)
+        for g in grams:
+            for tid in self.index.get(g, ()):
+                shared[tid] += 1
+        scored = []
+        n = len(grams)
+        for tid, common in shared.items():
+            score = 2.0 * common / (n + self.term_sizes[tid])
+            if score >= min_score and self.term_digits[tid] == digits and self._allowed(tid, categories):
+                scored.append((score, self.terms[tid]))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [(term, round(score, 3)) for score, term in scored[:top_k]]
+
+    @staticmethod
+    def _absorbs_filler(span, term):
+        """
+        True if a loose match pulls in stopwords or time words the term does not
+        contain ("fever with chills at night" is not a fuzzy "fever with chills";
+        "chest pain and cough" is two entities).
+        """
+        term_words = set(term.replace("-", " ").split())
+        return any((w in STOPWORDS or w in TIME_WORDS) and w not in term_words for w in span)
+
+    @staticmethod
+    def split_qualifiers(text):
+        """Return (text without numeric qualifiers, [qualifiers])."""
+        qualifiers = [(m.group("q") or m.group("bare")).strip() for m in QUALIFIER_RE.finditer(text)]
+        return QUALIFIER_RE.sub(" ", text), qualifiers
+
+    def normalize(self, text, categories=None):
+        """
+        Normalize one extracted string, e.g. "slight fever for 7 days" →
+        {"text": ..., "canonical": [{"term": "fever", "score": 1.0, ...}], "qualifiers": ["7 days"]}
+        """
+        remainder, qualifiers = self.split_qualifiers(str(text))
+        remainder = FILLER_RE.sub(" ", remainder.lower())
+        words = re.sub(r"[^a-z0-9+\-\s]", " ", remainder).split()
+
+        # Score every contiguous word span, then keep the best non-overlapping ones
+        candidates = []
+        for i in range(len(words)):
+            if words[i] in STOPWORDS:
+                continue
+            for j in range(i + 1, min(i + MAX_SPAN_WORDS, len(words)) + 1):
+                span = words[i:j]
+                if span[-1] in STOPWORDS or (j - i == 1 and (span[0] in MODIFIERS or span[0] in TIME_WORDS)):
+                    continue
+                for term, score in self.lookup(" ".join(span), categories=categories):
+                    if score < 1.0 and self._absorbs_filler(span, term):
+                        continue
+                    candidates.append((score, j - i, i, j, term))
+        # A term that also matches a sub-span exactly is reported with that span and score 1.0
+        exact = {c[4] for c in candidates if c[0] == 1.0}
+        candidates = [c for c in candidates if c[0] == 1.0 or c[4] not in exact]
+        # Prefer close matches covering more words: a loose match must cover clearly
+        # more words than an exact one to win ("type 2 diabetes" over "diabetes")
+        candidates.sort(key=lambda c: (-c[0] ** 2 * c[1], -c[0], c[2]))
+
+        taken, canonical, seen = set(), [], set()
+        for score, _, i, j, term in candidates:
+            span = set(range(i, j))
+            if span & taken or term in seen:
+                continue
+            taken |= span
+            seen.add(term)
+            canonical.append({"term": term, "score": score, "category": self.categories.get(term, [])})
+
+        return {"text": text, "canonical": canonical, "qualifiers": qualifiers}
+
+
+def normalize_entities(ehr, normalizer):
+    """Normalize every string value of a structured NER dict, key by key."""
+    normalized = {}
+    for key in STRUCTURED_KEYS:
+        value = ehr.get(key)
+        values = value if isinstance(value, list) else [value]
+        categories = KEY_CATEGORIES.get(key)
+        normalized[key] = [normalizer.normalize(v, categories) for v in values if v and str(v).strip()]
+    return normalized
+
 # ---------------------------
 # Summarization (T5 + Ollama refinement)
 # ---------------------------
 def load_summarizer():
+    # transformers only required for T5 summarizer — imported lazily, it takes seconds
+    try:
+        from transformers import pipeline
+    except ImportError:
+        raise ImportError("Please install transformers: pip install transformers")
+
     try:
         # Force using CPU for T5 as well
         return pipeline("summarization", model="t5-small", tokenizer="t5-small", device=-1)  # -1 for CPU
@@ -191,12 +454,13 @@ def summarize_text(summarizer, text):
         return "Summarizer unavailable."
     try:
         clean_text = re.sub(r'\[[^\]]+\]', '', text).strip()
-        summary_output = summarizer(
-            f"summarize: {clean_text}",
-            max_length=120,   # slightly tighter to reduce warnings
-            min_length=30,
-            do_sample=False
-        )
+        with get_governor().stage("summary"):
+            summary_output = summarizer(
+                f"summarize: {clean_text}",
+                max_length=120,   # slightly tighter to reduce warnings
+                min_length=30,
+                do_sample=False
+            )
         summary = summary_output[0]['summary_text'].strip()
 
         ollama_prompt = f"""
@@ -280,16 +544,68 @@ Return ONLY the JSON object, nothing else.
 # ---------------------------
 # FHIR bundle generator
 # ---------------------------
-def to_fhir_bundle(entities):
+def as_list(value):
+    """NER values may be "", a string or a list of strings; always return a list of non-empty strings."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if v and str(v).strip()]
+    return [str(value).strip()] if str(value).strip() else []
+
+def fhir_id(value, source=None):
+    """
+    Make a string safe for use as a FHIR resource id ([A-Za-z0-9-.], max 64 chars).
+    If it had to be sanitized or truncated, a short hash of the original value
+    (and of `source`, e.g. the transcript's full path) keeps ids distinct:
+    "a b" and "a-b" no longer map to the same id.
+    """
+    value = str(value)
+    safe = re.sub(r"[^A-Za-z0-9\-.]", "-", value)
+    if safe == value and len(safe) <= FHIR_ID_MAX_LEN:
+        return safe or "1"
+    digest = hashlib.sha1(f"{source or ''}\0{value}".encode("utf-8")).hexdigest()[:FHIR_ID_HASH_LEN]
+    return f"{safe[:FHIR_ID_MAX_LEN - FHIR_ID_HASH_LEN - 1]}-{digest}"
+
+def fhir_code(text, key, normalizer=None):
+    """
+    CodeableConcept for an extracted string. With a normalizer, its canonical
+    PreTraining.csv terms are attached as codings next to the original text.
+    """
+    code = {"text": text}
+    if normalizer:
+        canonical = normalizer.normalize(text, KEY_CATEGORIES.get(key))["canonical"]
+        if canonical:
+            code["coding"] = [
+                {"system": PRETRAIN_CODE_SYSTEM, "code": c["term"], "display": c["term"]}
+                for c in canonical
+            ]
+    return code
+
+def to_fhir_bundle(entities, visit_id="1", summary=None, source=None, normalizer=None):
     """
     Convert extracted entities into a minimal FHIR Bundle.
 
+    Every resource gets an id derived from `visit_id` (one visit = one transcript;
+    `source` is the transcript's path, hashed into ids that fhir_id() had to shorten),
+    and clinical resources reference the visit's Patient and Encounter, so they can
+    still be traced back to the visit once split into per-type NDJSON files.
+    If `summary` is given it is added as a Composition. With a `normalizer`,
+    Conditions and Observations carry their canonical terms as code.coding.
+
     NOTE:
     - Static demo names have been removed.
     - You can plug real patient/doctor names here if you add them to STRUCTURED_KEYS / NER.
     """
     now = datetime.now().isoformat()
 
+    def rid(kind, n=None):
+        # The 64-char limit applies to the whole id, prefix and counter included
+        return fhir_id(f"{kind}-{visit_id}" + (f"-{n}" if n else ""), source)
+
+    patient_ref = {"reference": f"Patient/{rid('patient')}"}
+    practitioner_ref = {"reference": f"Practitioner/{rid('doctor')}"}
+    encounter_ref = {"reference": f"Encounter/{rid('encounter')}"}
+
     bundle = {
         "resourceType": "Bundle",
         "type": "collection",
@@ -299,7 +615,7 @@ def to_fhir_bundle(entities):
     # Patient resource (no static name)
     patient_resource = {
         "resourceType": "Patient",
-        "id": "patient-1",
+        "id": rid("patient"),
         # "name": [{"text": "<PATIENT_NAME>"}],  # TODO: Inject actual patient name if available
     }
     bundle["entry"].append({"resource": patient_resource})
@@ -307,46 +623,293 @@ def to_fhir_bundle(entities):
     # Practitioner resource (no static name)
     practitioner_resource = {
         "resourceType": "Practitioner",
-        "id": "doctor-1",
+        "id": rid("doctor"),
         # "name": [{"text": "<DOCTOR_NAME>"}],  # TODO: Inject actual doctor name if available
     }
     bundle["entry"].append({"resource": practitioner_resource})
 
-    # Diagnosis → Condition
-    diagnosis = entities.get("Diagnosis")
-    if diagnosis:
+    # The consultation itself
+    bundle["entry"].append({
+        "resource": {
+            "resourceType": "Encounter",
+            "id": rid("encounter"),
+            "status": "finished",
+            "subject": patient_ref,
+            "participant": [{"individual": practitioner_ref}],
+        }
+    })
+
+    # Diagnosis → Conditions (one per diagnosis)
+    for n, diagnosis in enumerate(as_list(entities.get("Diagnosis")), start=1):
         bundle["entry"].append({
             "resource": {
                 "resourceType": "Condition",
-                "code": {"text": diagnosis},
+                "id": rid("condition", n),
+                "subject": patient_ref,
+                "encounter": encounter_ref,
+                "code": fhir_code(diagnosis, "Diagnosis", normalizer),
                 "recordedDate": now,
             }
         })
 
-    # Symptoms → Observations
-    for s in entities.get("Symptoms", []) or []:
-        if not s:
-            continue
+    # Symptoms → Observations (one per symptom)
+    for n, s in enumerate(as_list(entities.get("Symptoms")), start=1):
         bundle["entry"].append({
             "resource": {
                 "resourceType": "Observation",
-                "code": {"text": s},
+                "id": rid("observation", n),
+                "status": "final",
+                "subject": patient_ref,
+                "encounter": encounter_ref,
+                "code": fhir_code(s, "Symptoms", normalizer),
                 "effectiveDateTime": now,
             }
         })
 
+    # Conversation summary → Composition
+    if summary:
+        bundle["entry"].append({
+            "resource": {
+                "resourceType": "Composition",
+                "id": rid("summary"),
+                "status": "final",
+                "type": {"text": "Consultation summary"},
+                "subject": patient_ref,
+                "encounter": encounter_ref,
+                "author": [practitioner_ref],
+                "date": now,
+                "title": "Consultation summary",
+                "section": [{"text": {
+                    "status": "generated",
+                    "div": f'<div xmlns="http://www.w3.org/1999/xhtml">{html.escape(summary)}</div>',
+                }}],
+            }
+        })
+
     return bundle
 
+# ---------------------------
+# Bulk NDJSON export
+# ---------------------------
+class FhirNdjsonWriter:
+    """
+    Stream FHIR resources into Bulk Data–style NDJSON files, one per resourceType
+    (Patient.ndjson, Encounter.ndjson, Observation.ndjson, Condition.ndjson, ...).
+
+    - Each resource is written as one compact JSON line as soon as it arrives,
+      so memory stays constant no matter how many transcripts are exported.
+    - Bundles are unpacked: only their entry resources are written, each once.
+    - gzip_output=True writes *.ndjson.gz instead.
+    """
+
+    def __init__(self, out_dir=NDJSON_DEFAULT_DIR, gzip_output=False):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.gzip_output = gzip_output
+        self.counts = {}
+        self._files = {}
+
+    def _handle(self, resource_type):
+        fh = self._files.get(resource_type)
+        if fh is None:
+            if self.gzip_output:
+                path = self.out_dir / f"{resource_type}.ndjson.gz"
+                fh = gzip.open(path, "wt", encoding="utf-8")
+            else:
+                path = self.out_dir / f"{resource_type}.ndjson"
+                fh = open(path, "w", encoding="utf-8")
+            self._files[resource_type] = fh
+            self.counts[resource_type] = 0
+        return fh
+
+    def write_resource(self, resource):
+        resource_type = resource.get("resourceType", "Unknown")
+        line = json.dumps(resource, separators=(",", ":"), ensure_ascii=False)
+        self._handle(resource_type).write(line + "\n")
+        self.counts[resource_type] += 1
+
+    def write_bundle(self, bundle):
+        """Write each entry resource of a Bundle to its resourceType file."""
+        for entry in bundle.get("entry", []):
+            resource = entry.get("resource")
+            if resource:
+                self.write_resource(resource)
+
+    def close(self):
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_transcripts(paths):
+    """
+    Yield (path, text) for every transcript, one at a time.
+    Directories are expanded to their *.txt files (sorted).
+    """
+    for p in paths:
+        p = Path(p)
+        files = sorted(p.glob("*.txt")) if p.is_dir() else [p]
+        for f in files:
+            if not f.exists():
+                print(f"⚠️ Skipping missing input: {f}")
+                continue
+            with open(f, "r", encoding="utf-8") as fh:
+                yield f, fh.read()
+
+
+def save_pretty_outputs(output_dir, input_path, ehr, fhir_bundle, normalized=None):
+    """
+    Write the per-transcript *_structured.json, *_ehr_bundle.json (and *_normalized.json) files.
+    Outputs passed as None are skipped.
+    """
+    stem = Path(output_dir) / Path(input_path).stem
+    structured_path = stem.parent / f"{stem.name}_structured.json"
+    ehr_bundle_path = stem.parent / f"{stem.name}_ehr_bundle.json"
+
+    if ehr is not None:
+        with open(structured_path, "w", encoding="utf-8") as f:
+            json.dump(ehr, f, indent=2)
+
+    if fhir_bundle is not None:
+        with open(ehr_bundle_path, "w", encoding="utf-8") as f:
+            json.dump(fhir_bundle, f, indent=2)
+
+    if normalized is not None:
+        normalized_path = stem.parent / f"{stem.name}_normalized.json"
+        with open(normalized_path, "w", encoding="utf-8") as f:
+            json.dump(normalized, f, indent=2)
+
+    return structured_path, ehr_bundle_path
+
+
+def run_bulk(paths, ndjson_dir=NDJSON_DEFAULT_DIR, gzip_output=False, pretty=False,
+             out_dir="recordings", summarize=False, normalizer=None):
+    """
+    Process many transcripts and stream their FHIR resources into NDJSON files.
+    Bundles are not printed; only a per-transcript progress line is shown.
+    With summarize=True each visit's summary is exported as a Composition; with a
+    normalizer, Conditions/Observations carry canonical PreTraining.csv terms as code.coding.
+    """
+    summarizer = load_summarizer() if summarize else None
+    processed, failed = 0, 0
+    seen_stems = set()
+
+    with FhirNdjsonWriter(ndjson_dir, gzip_output=gzip_output) as writer:
+        for path, text in iter_transcripts(paths):
+            ehr = ask_ollama_json_ner(text)
+            if not ehr or not isinstance(ehr, dict):
+                print(f"⚠️ NER extraction failed: {path.name}")
+                failed += 1
+                continue
+
+            # Same-named transcripts from different directories must not share ids
+            visit_id = path.stem if path.stem not in seen_stems else str(path.with_suffix(""))
+            seen_stems.add(path.stem)
+
+            summary = summarize_text(summarizer, text) if summarizer else None
+            fhir_bundle = to_fhir_bundle(ehr, visit_id=visit_id, summary=summary,
+                                         source=str(path.resolve()), normalizer=normalizer)
+            writer.write_bundle(fhir_bundle)
+            if pretty:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+                normalized = normalize_entities(ehr, normalizer) if normalizer else None
+                save_pretty_outputs(out_dir, path, ehr, fhir_bundle, normalized)
+            processed += 1
+            print(f"✅ {path.name}")
+
+    print(f"\n📦 Bulk export saved to {ndjson_dir}: {processed} transcripts, {failed} failed")
+    for resource_type, n in sorted(writer.counts.items()):
+        print(f"   - {resource_type}: {n}")
+    return writer.counts
+
+
+# ---------------------------
+# FHIR re-generation
+# ---------------------------
+def regenerate_fhir(structured_path, out_dir=None):
+    """
+    Rebuild *_ehr_bundle.json from an existing *_structured.json.
+    Needs neither Ollama nor transformers.
+    """
+    structured_path = Path(structured_path)
+    with open(structured_path, "r", encoding="utf-8") as f:
+        ehr = json.load(f)
+    if not isinstance(ehr, dict):
+        raise ValueError(f"{structured_path} does not contain a JSON object")
+
+    stem = structured_path.stem
+    if stem.endswith("_structured"):
+        stem = stem[: -len("_structured")]
+    output_dir = Path(out_dir) if out_dir else structured_path.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    ehr_bundle_path = output_dir / f"{stem}_ehr_bundle.json"
+    with open(ehr_bundle_path, "w", encoding="utf-8") as f:
+        json.dump(to_fhir_bundle(ehr), f, indent=2)
+    return ehr_bundle_path
+
+
 # ---------------------------
 # Main
 # ---------------------------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Summarize + Extract EMR using T5 + Ollama JSON NER")
     parser.add_argument("--input", "-i")
-    parser.add_argument("--out_dir", "-o", default="recordings")
+    parser.add_argument("--out_dir", "-o", default=None,
+                        help="Output directory (default: recordings, or the --fhir-from file's folder)")
     parser.add_argument("--pretrain", "-p", default=DEFAULT_PRETRAIN_CSV)
+    parser.add_argument("--skip-summary", action="store_true",
+                        help="Skip the T5 + Ollama summary (transformers is not imported)")
+    parser.add_argument("--ner-only", action="store_true",
+                        help="Only run NER: write *_structured.json (+ *_normalized.json), no summary or FHIR bundle")
+    parser.add_argument("--fhir-from", metavar="STRUCTURED_JSON",
+                        help="Regenerate the FHIR bundle from an existing *_structured.json and exit")
+    parser.add_argument("--bulk", nargs="+", metavar="PATH",
+                        help="Transcripts or directories of *.txt to export as FHIR NDJSON")
+    parser.add_argument("--ndjson_dir", default=NDJSON_DEFAULT_DIR,
+                        help="Output directory for bulk NDJSON files")
+    parser.add_argument("--gzip", action="store_true", help="Gzip bulk NDJSON files")
+    parser.add_argument("--pretty", action="store_true",
+                        help="In bulk mode, also write per-transcript pretty JSON files")
+    parser.add_argument("--with-summary", action="store_true",
+                        help="In bulk mode, also summarize each transcript and export it as a Composition")
     args = parser.parse_args()
 
+    if args.bulk and args.ner_only:
+        parser.error("--ner-only cannot be combined with --bulk (bulk mode exports FHIR NDJSON)")
+
+    if args.fhir_from:
+        if not os.path.exists(args.fhir_from):
+            print("❌ Structured JSON file missing or invalid.")
+            sys.exit(1)
+        try:
+            ehr_bundle_path = regenerate_fhir(args.fhir_from, args.out_dir)
+        except (ValueError, OSError) as e:  # json.JSONDecodeError is a ValueError
+            print(f"❌ Could not regenerate FHIR bundle from {args.fhir_from}: {e}")
+            sys.exit(1)
+        print(f"🔨 FHIR bundle regenerated: {ehr_bundle_path}")
+        sys.exit(0)
+
+    skip_summary = args.skip_summary or args.ner_only
+    out_dir = args.out_dir or "recordings"
+    DEVICE_TYPE = detect_device()
+
+    entity_dict, known_terms = build_entity_resources(args.pretrain)
+    normalizer = TermNormalizer(known_terms, entity_dict) if known_terms else None
+
+    if args.bulk:
+        run_bulk(args.bulk, ndjson_dir=args.ndjson_dir, gzip_output=args.gzip,
+                 pretty=args.pretty, out_dir=out_dir,
+                 summarize=args.with_summary and not skip_summary,
+                 normalizer=normalizer)
+        sys.exit(0)
+
     input_path = args.input or get_last_input_path()
     if not input_path or not os.path.exists(input_path):
         print("❌ Input file missing or invalid.")
@@ -356,15 +919,15 @@ if __name__ == "__main__":
     with open(input_path, "r", encoding="utf-8") as f:
         text = f.read()
 
-    output_dir = Path(args.out_dir)
+    output_dir = Path(out_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
-    stem = output_dir / Path(input_path).stem
 
-    summarizer = load_summarizer()
-    summary = summarize_text(summarizer, text)
-    print("\n==================== CONVERSATION SUMMARY ====================")
-    print(summary)
-    print("==============================================================\n")
+    if not skip_summary:
+        summarizer = load_summarizer()
+        summary = summarize_text(summarizer, text)
+        print("\n==================== CONVERSATION SUMMARY ====================")
+        print(summary)
+        print("==============================================================\n")
 
     # Fast JSON-based NER
     print("🦙 Extracting structured clinical entities (JSON NER)...")
@@ -374,22 +937,22 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Convert to FHIR bundle
-    fhir_bundle = to_fhir_bundle(ehr)
-    print("FHIR Bundle:")
-    pprint(fhir_bundle, indent=2)
+    fhir_bundle = None
+    if not args.ner_only:
+        fhir_bundle = to_fhir_bundle(ehr, normalizer=normalizer)
+        print("FHIR Bundle:")
+        pprint(fhir_bundle, indent=2)
 
-    # ----- File paths (no invalid with_suffix) -----
-    structured_path = stem.parent / f"{stem.name}_structured.json"
-    ehr_bundle_path = stem.parent / f"{stem.name}_ehr_bundle.json"
+    # Map extracted strings onto canonical PreTraining terms
+    normalized = normalize_entities(ehr, normalizer) if normalizer else None
 
-    # Save structured entities to JSON
-    with open(structured_path, "w", encoding="utf-8") as f:
-        json.dump(ehr, f, indent=2)
-
-    # Save FHIR bundle
-    with open(ehr_bundle_path, "w", encoding="utf-8") as f:
-        json.dump(fhir_bundle, f, indent=2)
+    # Save structured entities + FHIR bundle (+ normalized entities)
+    structured_path, ehr_bundle_path = save_pretty_outputs(output_dir, input_path, ehr, fhir_bundle, normalized)
 
     print(f"\n🔨 Processed output saved to {output_dir}")
     print(f"   - Structured entities: {structured_path.name}")
-    print(f"   - FHIR bundle:        {ehr_bundle_path.name}\n")
+    if fhir_bundle is not None:
+        print(f"   - FHIR bundle:        {ehr_bundle_path.name}")
+    if normalized is not None:
+        print(f"   - Normalized terms:   {Path(input_path).stem}_normalized.json")
+    print()